@@ -1,54 +1,124 @@
 import argparse
 import asyncio
-import csv
-import json
+import gzip
+import itertools
 import os
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
-import monarchmoney
-from portfolio_utils import extract_holding_fields
+import orjson
+from portfolio_utils import iter_holdings, write_holdings_csv
 
-async def sync_monarch_to_sheets(credentials_path: str = "credentials.json", out_file: str = "portfolio.json", csv_file: str = None):
-    # 1. Connect to Monarch
-    mm = monarchmoney.MonarchMoney()
-    
+if TYPE_CHECKING:
+    import monarchmoney
+
+
+def load_credentials(path: str = 'credentials.json'):
     # Reading credentials from a secure location is recommended for production use
     # Try credentials.json first, then fall back to environment variables
-    def load_credentials(path: str = 'credentials.json'):
-        p = Path(path)
-        if p.exists():
-            with p.open('r') as fh:
-                data = json.load(fh)
-            return data.get('email'), data.get('password')
-        # Fallback to env vars
-        return os.environ.get('MONARCH_EMAIL'), os.environ.get('MONARCH_PASSWORD')
+    p = Path(path)
+    if p.exists():
+        data = orjson.loads(p.read_bytes())
+        return data.get('email'), data.get('password')
+    # Fallback to env vars
+    return os.environ.get('MONARCH_EMAIL'), os.environ.get('MONARCH_PASSWORD')
 
-    email, password = load_credentials(credentials_path)
-    if not email or not password:
-        raise RuntimeError(
-            "Credentials not found. Create credentials.json with {'email':..., 'password':...} or set MONARCH_EMAIL and MONARCH_PASSWORD env vars."
-        )
+
+async def login(mm: "monarchmoney.MonarchMoney", email: str, password: str, use_saved_session: bool = True) -> None:
+    """
+    Log into Monarch Money, saving the session token for subsequent runs.
+    The token is stored in the library's default session file (.mm/mm_session.pickle).
+    """
+    import monarchmoney
 
     try:
-        await mm.login(email=email, password=password, save_session=False, use_saved_session=False)
+        await mm.login(email=email, password=password, save_session=True, use_saved_session=use_saved_session)
     except monarchmoney.RequireMFAException as e:
         print(f"Failed to login, fail back to MFA: {e}")
         await mm.multi_factor_authenticate(email, password,
                                            input("Two Factor Code: "))  # This will prompt you to complete MFA in the console
+        mm.save_session()
     except Exception as e:
         print(f"Failed to login: {e}")
         raise
 
+
+async def connect(credentials_path: str = "credentials.json", use_saved_session: bool = True) -> "monarchmoney.MonarchMoney":
+    """
+    Create a MonarchMoney client and log in with the given credentials.
+    The returned client can be passed to sync_monarch_to_sheets() repeatedly.
+    """
+    # Imported here so parse-only and --help invocations skip the aiohttp/gql import cost
+    import monarchmoney
+
+    mm = monarchmoney.MonarchMoney()
+
+    email, password = load_credentials(credentials_path)
+    if not email or not password:
+        raise RuntimeError(
+            "Credentials not found. Create credentials.json with {'email':..., 'password':...} or set MONARCH_EMAIL and MONARCH_PASSWORD env vars."
+        )
+
+    await login(mm, email, password, use_saved_session=use_saved_session)
+    return mm
+
+
+async def fetch_portfolio(mm: "monarchmoney.MonarchMoney", credentials_path: str = "credentials.json") -> dict:
+    """
+    Fetch the portfolio with mm, logging in again once if its session has expired.
+    The new session token is copied onto mm, so the client stays usable afterwards.
+    """
+    from gql.transport.exceptions import TransportServerError
+
+    try:
+        return await mm.get_portfolio()
+    except TransportServerError as e:
+        if e.code != 401:
+            raise
+    print("Saved session expired, logging in again")
+    mm.delete_session()
+    # Copy the fresh token onto mm rather than reloading it from disk, since
+    # mm may use a different session file than the new client
+    fresh = await connect(credentials_path, use_saved_session=False)
+    mm.set_token(fresh.token)
+    mm._headers["Authorization"] = f"Token {fresh.token}"
+    mm.save_session()
+    return await mm.get_portfolio()
+
+
+async def sync_monarch_to_sheets(credentials_path: str = "credentials.json", out_file: str = "portfolio.json", csv_file: str = None, pretty: bool = False, mm: Optional["monarchmoney.MonarchMoney"] = None) -> dict:
+    """
+    Fetch the portfolio, save it to out_file (and optionally csv_file) and return it.
+    Pass a logged-in client from connect() as mm to reuse it across calls;
+    otherwise a new one is created from credentials_path.
+    """
+    # 1. Connect to Monarch, reusing the session token saved by a previous run
+    if mm is None:
+        mm = await connect(credentials_path)
+
     # 2. Fetch entire investment portfolio and save to JSON
-    portfolio = await mm.get_portfolio()
-    with open(out_file, "w") as outfile:
-        json.dump(portfolio, outfile, indent=4)
+    portfolio = await fetch_portfolio(mm, credentials_path)
+    save_portfolio_json(portfolio, out_file, pretty=pretty)
     
     # 3. Write to CSV file for easier consumption (optional, if csv_file is specified)
     if csv_file:
         write_portfolio_to_csv(portfolio, csv_file)
 
     print("Sync Complete!")
+    return portfolio
+
+
+def save_portfolio_json(portfolio: dict, out_file: str, pretty: bool = False) -> None:
+    """
+    Writes the portfolio as compact JSON, gzip-compressed if out_file ends in .gz.
+    Use pretty=True for indented, human-readable output.
+    """
+    data = orjson.dumps(portfolio, option=orjson.OPT_INDENT_2 if pretty else None)
+    if out_file.endswith(".gz"):
+        with gzip.open(out_file, "wb", compresslevel=3) as outfile:
+            outfile.write(data)
+    else:
+        Path(out_file).write_bytes(data)
 
 
 def write_portfolio_to_csv(portfolio: dict, csv_file: str) -> None:
@@ -56,31 +126,20 @@ def write_portfolio_to_csv(portfolio: dict, csv_file: str) -> None:
     Extracts holdings from portfolio and writes to CSV.
     Flattens nested structure for easier consumption.
     """
-    holdings_list = []
-    
     # Navigate through the portfolio structure to extract holdings
+    edges = []
     if "portfolio" in portfolio and "aggregateHoldings" in portfolio["portfolio"]:
         edges = portfolio["portfolio"]["aggregateHoldings"].get("edges", [])
-        for edge in edges:
-            node = edge.get("node", {})
-            security_info = node.get("security", {})
-            holdings = node.get("holdings", [])
-            
-            for holding in holdings:
-                record = extract_holding_fields(holding, security_info)
-                holdings_list.append(record)
     
-    if not holdings_list:
+    holdings = iter_holdings(edges)
+    first = next(holdings, None)
+    if first is None:
         print(f"No holdings found to write to CSV")
         return
     
-    fieldnames = holdings_list[0].keys()
-    with open(csv_file, "w", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(holdings_list)
+    count = write_holdings_csv(itertools.chain((first,), holdings), csv_file)
     
-    print(f"Wrote {len(holdings_list)} holdings to {csv_file}")
+    print(f"Wrote {count} holdings to {csv_file}")
 
 
 def parse_args():
@@ -95,7 +154,12 @@ def parse_args():
         "-o",
         "--out",
         default="portfolio.json",
-        help="Output JSON filename (default: portfolio.json)",
+        help="Output JSON filename; a .gz suffix writes gzip-compressed JSON (default: portfolio.json)",
+    )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Write indented JSON for human inspection (default: compact)",
     )
     parser.add_argument(
         "--csv",
@@ -107,4 +171,4 @@ def parse_args():
 
 if __name__ == "__main__":
     args = parse_args()
-    asyncio.run(sync_monarch_to_sheets(credentials_path=args.credentials, out_file=args.out, csv_file=args.csv))
\ No newline at end of file
+    asyncio.run(sync_monarch_to_sheets(credentials_path=args.credentials, out_file=args.out, csv_file=args.csv, pretty=args.pretty))
\ No newline at end of file
@@ -1,34 +1,84 @@
 import argparse
-import json
-import pandas as pd
+import gzip
+from pathlib import Path
 
-from portfolio_utils import extract_holding_fields
+import ijson
 
+from portfolio_utils import FIELDNAMES, VALUE_INDEX, iter_holdings, write_holdings_csv
 
-def process_portfolio(json_file):
-    with open(json_file, 'r') as f:
-        data = json.load(f)
 
-    # Navigate through the GraphQL structure to the edges
-    edges = data.get('portfolio', {}).get('aggregateHoldings', {}).get('edges', [])
+def _value_sort_key(row):
+    # Holdings without a value sort last, matching pandas' NaN placement
+    value = row[VALUE_INDEX]
+    return float('-inf') if value is None else value
 
-    holdings_list = []
 
-    for edge in edges:
-        node = edge.get('node', {})
-        # Each node contains an array of holdings across different accounts
-        individual_holdings = node.get('holdings', [])
-        
-        for holding in individual_holdings:
-            security_info = node.get('security', {})
-            extracted_data = extract_holding_fields(holding, security_info)
-            holdings_list.append(extracted_data)
+def _open_portfolio(path):
+    path = Path(path)
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rb')
+    return path.open('rb')
+
+
+def iter_edges(source):
+    """
+    Yield the aggregateHoldings edges from a portfolio JSON path or already-loaded dict.
+    Files are parsed incrementally, so only one edge is held in memory at a time.
+    """
+    if isinstance(source, (str, Path)):
+        with _open_portfolio(source) as f:
+            yield from ijson.items(f, 'portfolio.aggregateHoldings.edges.item', use_float=True)
+    else:
+        # Navigate through the GraphQL structure to the edges
+        yield from source.get('portfolio', {}).get('aggregateHoldings', {}).get('edges', [])
+
+
+def extract_holdings_sorted(source):
+    # Sort by value for better readability
+    return sorted(iter_holdings(iter_edges(source)), key=_value_sort_key, reverse=True)
+
+
+# Column dtypes for to_dataframe(); everything that is not numeric is text
+_NUMERIC_FIELDS = ('quantity', 'closing_price', 'value', 'current_price')
+NUMERIC_DTYPES = {field: 'float64' for field in _NUMERIC_FIELDS}
+DTYPES = {field: NUMERIC_DTYPES.get(field, 'string') for field in FIELDNAMES}
+
+
+def to_dataframe(holdings, dtypes=DTYPES):
+    # pandas is only needed for DataFrame consumers (e.g. markdown output)
+    import pandas as pd
+
+    # Explicit columns name the positional rows, and explicit dtypes keep
+    # numeric columns float64 even when some holdings are null
+    df = pd.DataFrame.from_records(holdings, columns=list(FIELDNAMES))
+    return df.astype(dtypes)
+
+
+def to_markdown(holdings):
+    """Render holdings as a Markdown table."""
+    # Text columns keep pandas' inferred dtype, so missing cells render as
+    # before instead of as <NA>
+    return to_dataframe(holdings, NUMERIC_DTYPES).to_markdown(index=False)
+
+
+OUTPUT_FORMATS = ('csv', 'parquet', 'feather')
+
+
+def default_output(output_format='csv'):
+    """Default output filename, with the extension matching output_format."""
+    return f"portfolio_holdings.{output_format}"
+
+
+def write_holdings(holdings, output, output_format='csv'):
+    if output_format == 'csv':
+        write_holdings_csv(holdings, output)
+    elif output_format == 'parquet':
+        to_dataframe(holdings).to_parquet(output, compression='zstd', index=False)
+    elif output_format == 'feather':
+        to_dataframe(holdings).to_feather(output)
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
 
-    # Convert to DataFrame and sort by value for better readability
-    df = pd.DataFrame(holdings_list)
-    df = df.sort_values(by='value', ascending=False)
-    
-    return df
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Parse Monarch portfolio JSON and output as CSV/Markdown")
@@ -36,28 +86,37 @@ def parse_args():
         "-i",
         "--input",
         default="portfolio.json",
-        help="Input JSON portfolio file (default: portfolio.json)",
+        help="Input JSON portfolio file, optionally gzip-compressed (.gz) (default: portfolio.json)",
     )
     parser.add_argument(
         "-o",
         "--output",
-        default="portfolio_holdings.csv",
-        help="Output CSV filename (default: portfolio_holdings.csv)",
+        default=None,
+        help="Output filename (default: portfolio_holdings.<format>)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="Output file format; parquet and feather require pyarrow (default: csv)",
     )
     parser.add_argument(
         "--markdown",
         action="store_true",
         help="Display output as markdown table (default: false)",
     )
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = default_output(args.format)
+    return args
 
 
 if __name__ == "__main__":
     args = parse_args()
-    df_holdings = process_portfolio(args.input)
+    holdings = extract_holdings_sorted(args.input)
     
     if args.markdown:
-        print(df_holdings.to_markdown(index=False))
+        print(to_markdown(holdings))
     
-    df_holdings.to_csv(args.output, index=False)
-    print(f"Saved {len(df_holdings)} holdings to {args.output}")
\ No newline at end of file
+    write_holdings(holdings, args.output, args.format)
+    print(f"Saved {len(holdings)} holdings to {args.output}")
\ No newline at end of file
@@ -1,29 +1,87 @@
 """Shared utilities for portfolio data extraction and formatting."""
 
+import csv
+from types import MappingProxyType
 
-def extract_holding_fields(holding: dict, security_info: dict) -> dict:
+# Shared read-only default for missing nested objects, so a lookup does not
+# allocate a fresh empty dict per holding.
+_EMPTY = MappingProxyType({})
+
+# Column order of the rows returned by extract_holding_row()
+FIELDNAMES = (
+    'account_id',
+    'account_name',
+    'account_mask',
+    'institution_name',
+    'holding_name',
+    'ticker',
+    'type',
+    'type_display',
+    'quantity',
+    'closing_price',
+    'value',
+    'security_id',
+    'security_name',
+    'security_ticker',
+    'current_price',
+    'price_updated',
+)
+
+# Position of the value column in extract_holding_row() tuples
+VALUE_INDEX = FIELDNAMES.index('value')
+
+
+def extract_holding_row(holding: dict, security_info: dict) -> tuple:
     """
-    Extract standardized fields from a holding.
-    Used by both getportfolio.py and parse_portfolio.py for consistency.
+    Extract standardized fields from a holding as a tuple in FIELDNAMES order.
+    Used by both getportfolio.py and parse_portfolio.py (via iter_holdings) for consistency.
     """
-    account_info = holding.get('account', {})
-    institution_info = account_info.get('institution', {})
+    account_info = holding.get('account', _EMPTY)
+    institution_info = account_info.get('institution', _EMPTY)
     
-    return {
-        'account_id': account_info.get('id', ''),
-        'account_name': account_info.get('displayName', ''),
-        'account_mask': account_info.get('mask', ''),
-        'institution_name': institution_info.get('name', ''),
-        'holding_name': holding.get('name', ''),
-        'ticker': holding.get('ticker', ''),
-        'type': holding.get('type', ''),
-        'type_display': holding.get('typeDisplay', ''),
-        'quantity': holding.get('quantity', 0),
-        'closing_price': holding.get('closingPrice', 0),
-        'value': holding.get('value', 0),
-        'security_id': security_info.get('id', ''),
-        'security_name': security_info.get('name', ''),
-        'security_ticker': security_info.get('ticker', ''),
-        'current_price': security_info.get('currentPrice', 0),
-        'price_updated': security_info.get('currentPriceUpdatedAt', ''),
-    }
+    return (
+        account_info.get('id', ''),
+        account_info.get('displayName', ''),
+        account_info.get('mask', ''),
+        institution_info.get('name', ''),
+        holding.get('name', ''),
+        holding.get('ticker', ''),
+        holding.get('type', ''),
+        holding.get('typeDisplay', ''),
+        holding.get('quantity', 0),
+        holding.get('closingPrice', 0),
+        holding.get('value', 0),
+        security_info.get('id', ''),
+        security_info.get('name', ''),
+        security_info.get('ticker', ''),
+        security_info.get('currentPrice', 0),
+        security_info.get('currentPriceUpdatedAt', ''),
+    )
+
+
+def iter_holdings(edges):
+    """
+    Yield one extract_holding_row() tuple per holding across aggregateHoldings edges.
+    Lets writers consume holdings without building an intermediate list.
+    """
+    for edge in edges:
+        node = edge.get('node', _EMPTY)
+        security_info = node.get('security', _EMPTY)
+        # Each node contains an array of holdings across different accounts
+        for holding in node.get('holdings', ()):
+            yield extract_holding_row(holding, security_info)
+
+
+def write_holdings_csv(holdings, csv_file: str) -> int:
+    """
+    Write holding rows (any iterable of extract_holding_row() tuples) to CSV
+    with a FIELDNAMES header. Returns the number of holdings written.
+    """
+    count = 0
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+        for row in holdings:
+            writer.writerow(row)
+            count += 1
+    return count
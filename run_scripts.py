@@ -2,86 +2,97 @@
 """
 Wrapper script to execute Monarch Money portfolio scripts within the venv.
 Provides a unified interface for running getportfolio.py and parse_portfolio.py.
+
+All steps run in-process. If a .venv exists and this script was started with
+another interpreter, it re-executes itself once under the venv Python.
 """
 
 import argparse
-import subprocess
-import sys
+import asyncio
 import os
+import sys
 from pathlib import Path
 
 
+VENV_PATH = Path(__file__).parent / ".venv"
+
+
 def get_venv_python():
-    """Get the path to the Python interpreter in the virtual environment."""
-    venv_path = Path(__file__).parent / ".venv"
-    python_path = venv_path / "bin" / "python"
+    """Get the path to the Python interpreter in the virtual environment, or None if absent."""
+    python_path = VENV_PATH / "bin" / "python"
+    return python_path if python_path.exists() else None
+
+
+def ensure_venv():
+    """
+    Re-execute this script under the venv interpreter unless already running in it.
     
-    if not python_path.exists():
-        raise RuntimeError(
-            f"Virtual environment not found at {venv_path}. "
-            "Please create it with: python3 -m venv .venv"
-        )
-    return str(python_path)
+    sys.prefix is compared rather than sys.executable, since .venv/bin/python is
+    usually a symlink to the base interpreter.
+    """
+    venv_python = get_venv_python()
+    if venv_python is None or Path(sys.prefix).resolve() == VENV_PATH.resolve():
+        return
+    os.execv(str(venv_python), [str(venv_python), str(Path(__file__).resolve()), *sys.argv[1:]])
 
 
 def run_getportfolio(
     credentials: str = "credentials.json",
     output: str = "portfolio.json",
     csv: str = None,
+    pretty: bool = False,
 ) -> int:
     """
-    Execute getportfolio.py to fetch portfolio from Monarch Money API.
+    Fetch portfolio from Monarch Money API via getportfolio.sync_monarch_to_sheets.
     
     Args:
         credentials: Path to credentials JSON file (default: credentials.json)
         output: Output path for portfolio JSON (default: portfolio.json)
         csv: Optional path to save holdings as CSV
+        pretty: If True, write indented JSON instead of compact JSON
     
     Returns:
-        Exit code from the script
+        Exit code (0 if successful)
     """
-    venv_python = get_venv_python()
-    script_path = Path(__file__).parent / "getportfolio.py"
-    
-    cmd = [venv_python, str(script_path)]
-    cmd.extend(["-c", credentials])
-    cmd.extend(["-o", output])
-    
-    if csv:
-        cmd.extend(["--csv", csv])
-    
-    print(f"Running: {' '.join(cmd)}")
-    return subprocess.call(cmd)
+    from getportfolio import sync_monarch_to_sheets
+
+    asyncio.run(sync_monarch_to_sheets(credentials_path=credentials, out_file=output, csv_file=csv, pretty=pretty))
+    return 0
 
 
 def run_parse_portfolio(
     input_file: str = "portfolio.json",
-    output: str = "portfolio_holdings.csv",
+    output: str = None,
     markdown: bool = False,
+    output_format: str = "csv",
 ) -> int:
     """
-    Execute parse_portfolio.py to parse portfolio JSON file.
+    Parse portfolio JSON file via parse_portfolio.extract_holdings_sorted and write_holdings.
     
     Args:
         input_file: Input portfolio JSON file (default: portfolio.json)
-        output: Output file path (default: portfolio_holdings.csv)
+        output: Output file path (default: portfolio_holdings.md with markdown,
+            otherwise portfolio_holdings.<output_format>)
         markdown: If True, output in Markdown format instead of CSV
+        output_format: File format when not writing Markdown: csv, parquet or feather
     
     Returns:
-        Exit code from the script
+        Exit code (0 if successful)
     """
-    venv_python = get_venv_python()
-    script_path = Path(__file__).parent / "parse_portfolio.py"
-    
-    cmd = [venv_python, str(script_path)]
-    cmd.extend(["-i", input_file])
-    cmd.extend(["-o", output])
-    
+    if markdown and output_format != "csv":
+        raise ValueError(f"--markdown cannot be combined with --format {output_format}")
+
+    from parse_portfolio import default_output, extract_holdings_sorted, to_markdown, write_holdings
+
+    if output is None:
+        output = default_output("md" if markdown else output_format)
+    holdings = extract_holdings_sorted(input_file)
     if markdown:
-        cmd.append("--markdown")
-    
-    print(f"Running: {' '.join(cmd)}")
-    return subprocess.call(cmd)
+        Path(output).write_text(to_markdown(holdings))
+    else:
+        write_holdings(holdings, output, output_format)
+    print(f"Saved {len(holdings)} holdings to {output}")
+    return 0
 
 
 def run_full_pipeline(
@@ -104,36 +115,32 @@ def run_full_pipeline(
     Returns:
         Exit code (0 if successful, non-zero on error)
     """
+    # Hand the fetched portfolio straight to the parser instead of
+    # re-reading portfolio_json, which is still written for --skip-fetch runs
+    portfolio = portfolio_json
     if not skip_fetch:
         print("\n=== Step 1: Fetching portfolio from Monarch Money ===")
-        fetch_code = run_getportfolio(
-            credentials=credentials,
-            output=portfolio_json,
-            csv=None,
-        )
-        if fetch_code != 0:
-            print(f"Error fetching portfolio (exit code: {fetch_code})")
-            return fetch_code
-    
-    print("\n=== Step 2: Parsing portfolio to CSV ===")
-    csv_code = run_parse_portfolio(
-        input_file=portfolio_json,
-        output=portfolio_csv,
-        markdown=False,
-    )
-    if csv_code != 0:
-        print(f"Error parsing to CSV (exit code: {csv_code})")
-        return csv_code
-    
-    print("\n=== Step 3: Parsing portfolio to Markdown ===")
-    md_code = run_parse_portfolio(
-        input_file=portfolio_json,
-        output=portfolio_md,
-        markdown=True,
-    )
-    if md_code != 0:
-        print(f"Error parsing to Markdown (exit code: {md_code})")
-        return md_code
+        from getportfolio import connect, sync_monarch_to_sheets
+
+        async def fetch():
+            # One logged-in client serves every Monarch call in the pipeline
+            mm = await connect(credentials)
+            return await sync_monarch_to_sheets(credentials_path=credentials, out_file=portfolio_json, mm=mm)
+
+        portfolio = asyncio.run(fetch())
+    
+    print("\n=== Step 2: Parsing portfolio ===")
+    from parse_portfolio import extract_holdings_sorted, to_markdown, write_holdings
+
+    holdings = extract_holdings_sorted(portfolio)
+    
+    print("\n=== Step 3: Writing CSV and Markdown ===")
+    # CSV goes through the csv module like parse_portfolio.py; only the
+    # Markdown table needs a DataFrame
+    write_holdings(holdings, portfolio_csv)
+    print(f"Saved {len(holdings)} holdings to {portfolio_csv}")
+    Path(portfolio_md).write_text(to_markdown(holdings))
+    print(f"Saved {len(holdings)} holdings to {portfolio_md}")
     
     print("\n=== Pipeline completed successfully ===")
     return 0
@@ -164,6 +171,11 @@ def main():
         "--csv",
         help="Optional path to save holdings as CSV",
     )
+    fetch_parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Write indented JSON instead of compact JSON",
+    )
     
     # parse subcommand
     parse_parser = subparsers.add_parser(
@@ -176,14 +188,19 @@ def main():
     )
     parse_parser.add_argument(
         "-o", "--output",
-        default="portfolio_holdings.csv",
-        help="Output file path (default: portfolio_holdings.csv)",
+        help="Output file path (default: portfolio_holdings.md with --markdown, otherwise portfolio_holdings.<format>)",
     )
     parse_parser.add_argument(
         "--markdown",
         action="store_true",
         help="Output in Markdown format instead of CSV",
     )
+    parse_parser.add_argument(
+        "--format",
+        choices=("csv", "parquet", "feather"),
+        default="csv",
+        help="Output file format when not using --markdown (default: csv)",
+    )
     
     # pipeline subcommand
     pipeline_parser = subparsers.add_parser(
@@ -221,18 +238,22 @@ def main():
         parser.print_help()
         return 0
     
+    ensure_venv()
+    
     try:
         if args.command == "fetch":
             return run_getportfolio(
                 credentials=args.credentials,
                 output=args.output,
                 csv=args.csv,
+                pretty=args.pretty,
             )
         elif args.command == "parse":
             return run_parse_portfolio(
                 input_file=args.input,
                 output=args.output,
                 markdown=args.markdown,
+                output_format=args.format,
             )
         elif args.command == "pipeline":
             return run_full_pipeline(